@@ -33,11 +33,64 @@ A simple example of a Streams application uses the :py:func:`model_feed` and :py
     # Use for IBM Streaming Analytics service in IBM Cloud
     #submit('STREAMING_ANALYTICS_SERVICE', topo)
 
+Compact models
+++++++++++++++
+
+The :py:func:`load_model` function compiles a PMML ``TreeModel``, ``RegressionModel`` or ``MiningModel`` into a :py:class:`CompactModel`.
+Trees and regression tables are stored in contiguous typed arrays, optionally with single precision, so that several model versions can be kept in memory::
+
+    import streamsx.pmml as pmml
+
+    model = pmml.load_model('Drug_pmml_model.xml', float32=True)
+    print(model.memory_footprint)
+    print(model.score({'Na_to_K': 12.5, 'BP': 'HIGH', 'Age': 47, 'Cholesterol': 'HIGH'}))
+
+For ``MiningModel`` ensembles :py:meth:`CompactModel.score_batch` scores a batch of records in chunks, optionally in parallel processes.
+With ``selectFirst`` and majority votes it stops evaluating segments once the result of a record cannot change.
+The time spent in each segment is reported by :py:attr:`CompactModel.segment_timings`::
+
+    with model.process_pool(4) as executor:
+        results = model.score_batch(records, executor=executor)
+    for timing in model.segment_timings:
+        print(timing['id'], timing['records'], timing['seconds'])
+
+When a single segment of a large ensemble is retrained, :py:func:`model_delta` compares the segments of both versions by content hash.
+:py:meth:`CompactModel.apply_delta` compiles only the changed segments and keeps the compiled form of the others::
+
+    delta = pmml.model_delta('ensemble_v1.xml', 'ensemble_v2.xml')
+    if delta is None:
+        model = pmml.load_model('ensemble_v2.xml')
+    else:
+        model.apply_delta(delta)
+
+Local execution
++++++++++++++++
+
+For functional and throughput tests :py:func:`score` and :py:func:`model_feed` can run in-process on a :py:class:`LocalTopology`.
+Records are scored with :py:func:`load_model` and the model feed reads the model from a local directory, no toolkit build or Streams instance is required::
+
+    topo = pmml.LocalTopology()
+    models = pmml.model_feed(topo, connection_configuration='/tmp/models', model_name='sample_pmml')
+    s = topo.source(['first tuple', 'second tuple']).as_string()
+    res = pmml.score(s, schema='tuple<rstring string, rstring result>', model_input_attribute_mapping='p=string', model_stream=models, raw_result_attribute_name='result')
+    res.print()
+    topo.run()
+
+Profiling
++++++++++
+
+The :py:mod:`streamsx.pmml.profile` module replays a CSV dataset against a model and reports node hit counts, average tree depth, time per record and missing value fallbacks.
+With ``--output`` it writes an equivalent model with mutually exclusive sibling nodes ordered by their observed frequency::
+
+    python -m streamsx.pmml.profile Drug_pmml_model.xml Drug_dataset.csv --mapping Na_to_K=Na/K --output Drug_reordered.xml
+
 """
 
 
 __version__='1.0.3'
 
-__all__ = ['score', 'model_feed']
+__all__ = ['score', 'model_feed', 'load_model', 'model_delta', 'CompactModel', 'LocalTopology']
 from streamsx.pmml._pmml import score, model_feed
+from streamsx.pmml._model import load_model, model_delta, CompactModel
+from streamsx.pmml._local import LocalTopology
 
@@ -0,0 +1,310 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2019
+
+import hashlib
+import json
+import logging
+import os
+import time
+import xml.etree.ElementTree as ET
+
+from streamsx.pmml._model import load_model, model_delta
+
+_logger = logging.getLogger(__name__)
+
+_MODEL_EXTENSIONS = ('.xml', '.pmml')
+
+
+def _attribute_names(schema):
+    """Returns the attribute names of a flat SPL tuple schema, ``None`` if the schema cannot be parsed."""
+    spl = schema if isinstance(schema, str) else getattr(schema, '_schema', None)
+    if not isinstance(spl, str):
+        return None
+    spl = spl.strip()
+    if not (spl.startswith('tuple<') and spl.endswith('>')):
+        return None
+    names = []
+    depth = 0
+    attribute = ''
+    for c in spl[len('tuple<'):-1] + ',':
+        if c == '<':
+            depth += 1
+        elif c == '>':
+            depth -= 1
+        if c == ',' and depth == 0:
+            names.append(attribute.split()[-1])
+            attribute = ''
+        else:
+            attribute += c
+    return names
+
+def _as_dict(tup):
+    if isinstance(tup, dict):
+        return dict(tup)
+    if isinstance(tup, str):
+        return {'string': tup}
+    if hasattr(tup, '_asdict'):
+        return dict(tup._asdict())
+    raise TypeError(tup)
+
+def _parse_mapping(mapping):
+    result = []
+    if mapping:
+        for entry in mapping.split(','):
+            left, sep, right = entry.partition('=')
+            if not sep:
+                raise ValueError("Invalid mapping entry: "+entry)
+            result.append((left.strip(), right.strip()))
+    return result
+
+
+class LocalStream(object):
+    """Stream of a :py:class:`LocalTopology`, tuples are passed to the downstream callables as they are submitted."""
+    def __init__(self, topology):
+        self.topology = topology
+        self._sinks = []
+
+    def _emit(self, tup):
+        for sink in self._sinks:
+            sink(tup)
+
+    def map(self, func, schema=None, name=None):
+        """Maps each tuple with ``func``, tuples returned for a tuple ``schema`` are converted to dicts."""
+        out = LocalStream(self.topology)
+        names = _attribute_names(schema) if schema is not None else None
+        def _map(tup):
+            result = func(tup)
+            if result is None:
+                return
+            if names is not None and isinstance(result, tuple):
+                result = dict(zip(names, result))
+            out._emit(result)
+        self._sinks.append(_map)
+        return out
+
+    def filter(self, func, name=None):
+        out = LocalStream(self.topology)
+        self._sinks.append(lambda tup: out._emit(tup) if func(tup) else None)
+        return out
+
+    def for_each(self, func, name=None):
+        self._sinks.append(func)
+
+    def print(self, name=None):
+        self.for_each(print)
+
+    def as_string(self):
+        return self
+
+    def as_json(self):
+        return self
+
+
+class LocalTopology(object):
+    """Runs ``score`` and ``model_feed`` in-process for functional and throughput tests.
+
+    Pass a ``LocalTopology`` instead of a :py:class:`~streamsx.topology.topology.Topology` to :py:func:`~streamsx.pmml.model_feed`, or a stream created from it to :py:func:`~streamsx.pmml.score`.
+    Records are scored with :py:func:`~streamsx.pmml.load_model`, no toolkit, compiler or Streams instance is needed.
+    The ``connection_configuration`` of ``model_feed`` is the path of a local directory that stands in for the WML repository, the model file is ``<model_name>.xml`` or ``<model_uid>.xml`` (``.pmml`` is accepted too).
+
+    Example::
+
+        topo = pmml.LocalTopology()
+        models = pmml.model_feed(topo, connection_configuration='/tmp/models', model_name='sample_pmml')
+        s = topo.source(['first tuple', 'second tuple']).as_string()
+        res = pmml.score(s, schema='tuple<rstring string, rstring result>', model_input_attribute_mapping='p=string', model_stream=models, raw_result_attribute_name='result')
+        results = []
+        res.for_each(results.append)
+        topo.run()
+    """
+    def __init__(self, name=None):
+        self.name = name
+        self._sources = []
+        self._feeds = []
+
+    def source(self, func, name=None):
+        """Creates a stream from an iterable or a callable returning an iterable."""
+        stream = LocalStream(self)
+        self._sources.append((func, stream))
+        return stream
+
+    def run(self):
+        """Submits all source tuples. The model feeds are polled before the first tuple and then before each tuple once their polling period expired."""
+        for feed in self._feeds:
+            feed.poll(force=True)
+        for func, stream in self._sources:
+            for tup in (func() if callable(func) else func):
+                for feed in self._feeds:
+                    feed.poll()
+                stream._emit(tup)
+
+
+class _LocalModelFeed(object):
+    """Emits the model data when the model file in the local repository directory changes.
+
+    When only segments of a ``MiningModel`` ensemble changed, the tuple carries a ``delta`` with the changed segments instead of the complete ``model``.
+    The delta is computed against the previous file content, whose hash is sent as ``base_hash`` in the metadata.
+    A scorer whose model has another hash, because it rejected that version, loads the complete model from the ``path`` in the metadata.
+    """
+    def __init__(self, topology, directory, model_name=None, model_uid=None, polling_period=None):
+        self.directory = directory
+        self.model_name = model_name
+        self.model_uid = model_uid
+        self.polling_period = polling_period
+        self.stream = LocalStream(topology)
+        self._last_poll = None
+        self._digest = None
+        self._content = None
+        topology._feeds.append(self)
+
+    def _path(self):
+        # model_uid takes precedence like in the WML model feed
+        base = self.model_uid if self.model_uid is not None else self.model_name
+        for extension in _MODEL_EXTENSIONS:
+            path = os.path.join(self.directory, base + extension)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def poll(self, force=False):
+        now = time.monotonic()
+        if not force and (self.polling_period is None or now - self._last_poll < self.polling_period):
+            return
+        self._last_poll = now
+        path = self._path()
+        if path is None:
+            return
+        with open(path, 'rb') as f:
+            content = f.read()
+        digest = hashlib.sha256(content).hexdigest()
+        if digest == self._digest:
+            return
+        self._digest = digest
+        metadata = {'path': path, 'hash': digest, 'last_modified': str(os.path.getmtime(path))}
+        if self.model_name is not None:
+            metadata['name'] = self.model_name
+        if self.model_uid is not None:
+            metadata['uid'] = self.model_uid
+        delta = None
+        if self._content is not None:
+            try:
+                delta = model_delta(self._content, content)
+            except ET.ParseError:
+                # the scorer reports the invalid document
+                pass
+        base_digest = hashlib.sha256(self._content).hexdigest() if self._content is not None else None
+        self._content = content
+        if delta is not None:
+            metadata['update'] = 'delta'
+            metadata['base_hash'] = base_digest
+            self.stream._emit({'delta': delta, 'metadata': metadata})
+        else:
+            metadata['update'] = 'full'
+            # load_model detects the encoding from the XML declaration
+            self.stream._emit({'model': content, 'metadata': metadata})
+
+
+class _LocalScorer(object):
+    """Scores tuples with a compact model, the model may be replaced by tuples of a local model feed."""
+    def __init__(self, stream, schema, model_input_attribute_mapping, model_output_attribute_mapping=None, model_stream=None, model_path=None, success_attribute_name=None, error_reason_attribute_name=None, raw_result_attribute_name=None, wml_meta_data_attribute_name=None):
+        self.names = _attribute_names(schema)
+        self.input_mapping = _parse_mapping(model_input_attribute_mapping)
+        self.output_mapping = _parse_mapping(model_output_attribute_mapping)
+        self.success_attribute_name = success_attribute_name
+        self.error_reason_attribute_name = error_reason_attribute_name
+        self.raw_result_attribute_name = raw_result_attribute_name
+        self.wml_meta_data_attribute_name = wml_meta_data_attribute_name
+        self.model = load_model(model_path) if model_path is not None else None
+        self.metadata = {}
+        self.stream = LocalStream(stream.topology)
+        stream._sinks.append(self)
+        if model_stream is not None:
+            model_stream._sinks.append(self.update_model)
+
+    def update_model(self, model_data):
+        metadata = dict(model_data.get('metadata', {}))
+        content = model_data.get('model')
+        if 'delta' in model_data:
+            if self.model is not None and metadata.get('base_hash') == self.metadata.get('hash'):
+                try:
+                    # unchanged segments keep their compiled form
+                    self.model.apply_delta(model_data['delta'])
+                    self.metadata = metadata
+                    return
+                except (ValueError, ET.ParseError) as e:
+                    _logger.info("Model delta not applicable, loading the complete model: %s", e)
+            # the delta is based on a version this scorer did not accept, request the complete model
+            try:
+                with open(metadata['path'], 'rb') as f:
+                    content = f.read()
+            except (KeyError, OSError) as e:
+                _logger.error("Cannot read model %s: %s", model_data.get('metadata'), e)
+                return
+            # the file may have changed since the delta was created
+            metadata['hash'] = hashlib.sha256(content).hexdigest()
+            metadata['update'] = 'full'
+            metadata.pop('base_hash', None)
+        try:
+            model = load_model(content)
+        except (ValueError, ET.ParseError) as e:
+            # keep scoring with the current model
+            _logger.error("Invalid model %s: %s", model_data.get('metadata'), e)
+            return
+        self.model = model
+        self.metadata = metadata
+
+    def _output_value(self, result, field):
+        if field in ('predictedValue', 'entityId'):
+            return result.get(field)
+        probabilities = result.get('probabilities', {})
+        if field == 'probability':
+            return probabilities.get(result.get('predictedValue'))
+        if field.startswith('probability(') and field.endswith(')'):
+            return probabilities.get(field[len('probability('):-1])
+        raise ValueError("Unknown model output field: "+field)
+
+    def __call__(self, tup):
+        success = False
+        reason = ''
+        result = None
+        try:
+            out = _as_dict(tup)
+        except TypeError:
+            out = {}
+            reason = 'Unsupported tuple type: ' + type(tup).__name__
+        else:
+            if self.model is None:
+                reason = 'No model loaded'
+            else:
+                try:
+                    record = dict((predictor, out.get(attribute)) for predictor, attribute in self.input_mapping)
+                    result = self.model.score(record)
+                    for attribute, field in self.output_mapping:
+                        out[attribute] = self._output_value(result, field)
+                    success = True
+                except Exception as e:
+                    # like the toolkit operator, a failing evaluation is reported in the output tuple
+                    reason = str(e) or type(e).__name__
+        if self.success_attribute_name is not None:
+            out[self.success_attribute_name] = success
+        if self.error_reason_attribute_name is not None:
+            out[self.error_reason_attribute_name] = reason
+        if self.raw_result_attribute_name is not None:
+            out[self.raw_result_attribute_name] = json.dumps([result]) if success else ''
+        if self.wml_meta_data_attribute_name is not None:
+            out[self.wml_meta_data_attribute_name] = dict(self.metadata)
+        if self.names is not None:
+            out = dict((name, out.get(name)) for name in self.names)
+        self.stream._emit(out)
+
+
+def model_feed(topology, connection_configuration, model_name=None, model_uid=None, polling_period=None):
+    if isinstance(connection_configuration, dict):
+        connection_configuration = connection_configuration.get('directory')
+    if not isinstance(connection_configuration, str) or not os.path.isdir(connection_configuration):
+        raise ValueError("Local model feed requires the path of a model directory as connection_configuration.")
+    return _LocalModelFeed(topology, connection_configuration, model_name, model_uid, polling_period).stream
+
+def score(stream, schema, **kwargs):
+    return _LocalScorer(stream, schema, **kwargs).stream
@@ -0,0 +1,1034 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2019
+
+import copy
+import hashlib
+import math
+import sys
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# predicate operator codes
+_TRUE = 0
+_FALSE = 1
+_EQ = 2
+_NE = 3
+_LT = 4
+_LE = 5
+_GT = 6
+_GE = 7
+_IS_MISSING = 8
+_IS_NOT_MISSING = 9
+_IS_IN = 10
+_IS_NOT_IN = 11
+_AND = 12
+_OR = 13
+_XOR = 14
+_SURROGATE = 15
+
+_SIMPLE_OPS = {'equal': _EQ, 'notEqual': _NE, 'lessThan': _LT, 'lessOrEqual': _LE, 'greaterThan': _GT, 'greaterOrEqual': _GE, 'isMissing': _IS_MISSING, 'isNotMissing': _IS_NOT_MISSING}
+_SET_OPS = {'isIn': _IS_IN, 'isNotIn': _IS_NOT_IN}
+_BOOLEAN_OPS = {'and': _AND, 'or': _OR, 'xor': _XOR, 'surrogate': _SURROGATE}
+_PREDICATE_TAGS = ('True', 'False', 'SimplePredicate', 'SimpleSetPredicate', 'CompoundPredicate')
+_MODEL_TAGS = ('TreeModel', 'RegressionModel', 'MiningModel')
+_CATEGORICAL_TYPES = ('string', 'boolean')
+_CATEGORICAL_OPTYPES = ('categorical', 'ordinal')
+_NUMERIC_TYPES = ('integer', 'float', 'double')
+
+# category code of input values that are not known to the model
+_UNKNOWN_CODE = -2
+
+# term codes of regression predictors that are no category codes
+_TERM_NUMERIC = -1
+_TERM_EQUAL = -2
+
+
+def _tag(elem):
+    return elem.tag.rsplit('}', 1)[-1]
+
+def _children(elem, *tags):
+    return [child for child in elem if _tag(child) in tags]
+
+def _child(elem, *tags):
+    for child in elem:
+        if _tag(child) in tags:
+            return child
+    return None
+
+def _tree_nodes(root):
+    """Yields the ``Node`` elements of a tree in breadth-first order, which is the layout of the compact node arrays."""
+    queue = deque([root])
+    while queue:
+        node = queue.popleft()
+        yield node
+        queue.extend(_children(node, 'Node'))
+
+def _digest(elem):
+    """Returns the SHA-256 content hash of an element, its tail text is ignored."""
+    tail = elem.tail
+    elem.tail = None
+    try:
+        return hashlib.sha256(ET.tostring(elem)).hexdigest()
+    finally:
+        elem.tail = tail
+
+def _header_digest(root, model):
+    """Returns the content hash of an ensemble without its segments, deltas are only applicable if it matches."""
+    parts = []
+    dictionary = _child(root, 'DataDictionary')
+    if dictionary is not None:
+        parts.append(_digest(dictionary))
+    parts.append(repr(sorted(model.attrib.items())))
+    for child in model:
+        if _tag(child) == 'Segmentation':
+            parts.append(repr(sorted(child.attrib.items())))
+        else:
+            parts.append(_digest(child))
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+def _parse(model):
+    if isinstance(model, bytes) or model.lstrip().startswith('<'):
+        return ET.fromstring(model)
+    return ET.parse(model).getroot()
+
+def _array_bytes(obj):
+    result = 0
+    for value in vars(obj).values():
+        if isinstance(value, array):
+            result += value.itemsize * len(value)
+        elif isinstance(value, (_Predicates, _SubModel, _Segment)):
+            result += _array_bytes(value)
+        elif isinstance(value, list):
+            result += sum(_array_bytes(v) for v in value if isinstance(v, (_SubModel, _Segment)))
+    return result
+
+
+class _Predicates(object):
+    """Predicates of a sub-model stored as parallel arrays, compound predicates refer to their operands by index."""
+    def __init__(self, ftype):
+        self.op = array('b')
+        self.field = array('i')
+        self.value = array(ftype)
+        self.code = array('i')
+        self.start = array('i')
+        self.length = array('i')
+        self.args = array('i')
+        # operands of numeric equal, notEqual, isIn and isNotIn are compared exactly, they keep double precision
+        self.set_values = array('d')
+
+    def _append(self, op, field=-1, value=0.0, code=-1, start=0, length=0):
+        self.op.append(op)
+        self.field.append(field)
+        self.value.append(value)
+        self.code.append(code)
+        self.start.append(start)
+        self.length.append(length)
+        return len(self.op) - 1
+
+    def compile(self, elem, ctx):
+        tag = _tag(elem)
+        if tag == 'True':
+            return self._append(_TRUE)
+        if tag == 'False':
+            return self._append(_FALSE)
+        if tag == 'SimplePredicate':
+            op = _SIMPLE_OPS.get(elem.get('operator'))
+            if op is None:
+                raise ValueError("Unsupported predicate operator: "+str(elem.get('operator')))
+            field = ctx._field(elem.get('field'), elem.get('value'))
+            if op in (_IS_MISSING, _IS_NOT_MISSING):
+                return self._append(op, field)
+            if ctx._categorical[field]:
+                if op not in (_EQ, _NE):
+                    raise ValueError("Unsupported operator '"+elem.get('operator')+"' for categorical field "+elem.get('field'))
+                return self._append(op, field, code=ctx._category_code(field, elem.get('value')))
+            if op in (_EQ, _NE):
+                self.set_values.append(float(elem.get('value')))
+                return self._append(op, field, start=len(self.set_values)-1)
+            return self._append(op, field, value=float(elem.get('value')))
+        if tag == 'SimpleSetPredicate':
+            op = _SET_OPS.get(elem.get('booleanOperator'))
+            if op is None:
+                raise ValueError("Unsupported set operator: "+str(elem.get('booleanOperator')))
+            members = _child(elem, 'Array')
+            values = _parse_array(members.text if members is not None else '')
+            field = ctx._field(elem.get('field'), values[0] if values else None)
+            if ctx._categorical[field]:
+                start = len(self.args)
+                self.args.extend(ctx._category_code(field, v) for v in values)
+                return self._append(op, field, code=1, start=start, length=len(values))
+            start = len(self.set_values)
+            self.set_values.extend(float(v) for v in values)
+            return self._append(op, field, code=-1, start=start, length=len(values))
+        if tag == 'CompoundPredicate':
+            op = _BOOLEAN_OPS.get(elem.get('booleanOperator'))
+            if op is None:
+                raise ValueError("Unsupported boolean operator: "+str(elem.get('booleanOperator')))
+            operands = [self.compile(child, ctx) for child in _children(elem, *_PREDICATE_TAGS)]
+            start = len(self.args)
+            self.args.extend(operands)
+            return self._append(op, start=start, length=len(operands))
+        raise ValueError("Unsupported predicate: "+tag)
+
+    def evaluate(self, p, row):
+        """Evaluates predicate ``p`` using three-valued logic, ``None`` means the result is unknown."""
+        op = self.op[p]
+        if op == _TRUE:
+            return True
+        if op == _FALSE:
+            return False
+        if op >= _AND:
+            return self._evaluate_compound(op, p, row)
+        v = row[self.field[p]]
+        if op == _IS_MISSING:
+            return v is None
+        if op == _IS_NOT_MISSING:
+            return v is not None
+        if v is None:
+            return None
+        if op >= _IS_IN:
+            start = self.start[p]
+            members = self.args if self.code[p] >= 0 else self.set_values
+            found = v in members[start:start+self.length[p]]
+            return found if op == _IS_IN else not found
+        if op == _EQ or op == _NE:
+            ref = self.code[p] if self.code[p] >= 0 else self.set_values[self.start[p]]
+            return (v == ref) if op == _EQ else (v != ref)
+        ref = self.value[p]
+        if op == _LT:
+            return v < ref
+        if op == _LE:
+            return v <= ref
+        if op == _GT:
+            return v > ref
+        return v >= ref
+
+    def _evaluate_compound(self, op, p, row):
+        start = self.start[p]
+        operands = self.args[start:start+self.length[p]]
+        if op == _SURROGATE:
+            for q in operands:
+                result = self.evaluate(q, row)
+                if result is not None:
+                    return result
+            return None
+        results = [self.evaluate(q, row) for q in operands]
+        if op == _AND:
+            if False in results:
+                return False
+            return None if None in results else True
+        if op == _OR:
+            if True in results:
+                return True
+            return None if None in results else False
+        if None in results:
+            return None
+        return results.count(True) % 2 == 1
+
+
+def _parse_array(text):
+    return list(_split_array(text or ''))
+
+def _split_array(text):
+    token = None
+    quoted = False
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if quoted:
+            if c == '\\' and i+1 < len(text):
+                token += text[i+1]
+                i += 1
+            elif c == '"':
+                quoted = False
+            else:
+                token += c
+        elif c == '"':
+            quoted = True
+            token = token or ''
+        elif c.isspace():
+            if token is not None:
+                yield token
+                token = None
+        else:
+            token = (token or '') + c
+        i += 1
+    if token is not None:
+        yield token
+
+
+class _SubModel(object):
+    function_name = None
+
+    def __init__(self, elem, ctx):
+        self.function_name = elem.get('functionName')
+        self.preds = _Predicates(ctx._ftype)
+
+    def trees(self):
+        return []
+
+
+class _TreeModel(_SubModel):
+    """Decision tree with the nodes in breadth-first order, so that the children of a node are stored contiguously."""
+    def __init__(self, elem, ctx):
+        super(_TreeModel, self).__init__(elem, ctx)
+        ftype = ctx._ftype
+        self.missing_value_strategy = elem.get('missingValueStrategy', 'none')
+        self.no_true_child_strategy = elem.get('noTrueChildStrategy', 'returnNullPrediction')
+        self.node_pred = array('i')
+        self.node_first_child = array('i')
+        self.node_child_count = array('i')
+        self.node_default_child = array('i')
+        self.node_id = array('i')
+        self.node_label = array('i')
+        self.node_score = array(ftype)
+        self.node_record_count = array(ftype)
+        self.node_dist_start = array('i')
+        self.node_dist_length = array('i')
+        self.dist_label = array('i')
+        self.dist_count = array(ftype)
+        self.dist_probability = array(ftype)
+
+        root = _child(elem, 'Node')
+        if root is None:
+            raise ValueError("TreeModel without root node")
+        nodes = list(_tree_nodes(root))
+        index = dict((id(node), i) for i, node in enumerate(nodes))
+        classification = self.function_name == 'classification'
+        default_children = []
+        for node in nodes:
+            pred = _child(node, *_PREDICATE_TAGS)
+            self.node_pred.append(self.preds.compile(pred, ctx) if pred is not None else self.preds._append(_TRUE))
+            children = _children(node, 'Node')
+            self.node_first_child.append(index[id(children[0])] if children else -1)
+            self.node_child_count.append(len(children))
+            default_children.append((node.get('defaultChild'), children))
+            self.node_id.append(ctx._intern(node.get('id')) if node.get('id') is not None else -1)
+            score = node.get('score')
+            if classification:
+                self.node_label.append(ctx._intern(score) if score is not None else -1)
+                self.node_score.append(0.0)
+            else:
+                self.node_label.append(-1)
+                self.node_score.append(float(score) if score is not None else math.nan)
+            self.node_record_count.append(float(node.get('recordCount', 0)))
+            self._compile_distribution(node, ctx)
+        for default, children in default_children:
+            target = -1
+            for child in children:
+                if default is not None and child.get('id') == default:
+                    target = index[id(child)]
+            self.node_default_child.append(target)
+
+    def _compile_distribution(self, node, ctx):
+        dists = _children(node, 'ScoreDistribution')
+        self.node_dist_start.append(len(self.dist_label))
+        self.node_dist_length.append(len(dists))
+        total = sum(float(d.get('recordCount', 0)) for d in dists)
+        for d in dists:
+            count = float(d.get('recordCount', 0))
+            self.dist_label.append(ctx._intern(d.get('value')))
+            self.dist_count.append(count)
+            if d.get('probability') is not None:
+                self.dist_probability.append(float(d.get('probability')))
+            else:
+                self.dist_probability.append(count / total if total > 0 else 0.0)
+
+    def trees(self):
+        return [self]
+
+    def _distribution(self, node):
+        start = self.node_dist_start[node]
+        return dict(zip(self.dist_label[start:start+self.node_dist_length[node]], self.dist_probability[start:start+self.node_dist_length[node]]))
+
+    def _descend(self, row, trace=None):
+        """Returns the index of the scoring node, ``-1`` for a null prediction or a list of ``(node, weight)`` pairs for aggregated missing value handling.
+
+        The optional ``trace`` is notified about visited nodes, the number of evaluated predicates and missing value fallbacks.
+        """
+        preds = self.preds
+        if trace is not None:
+            trace.evaluated(self, 1)
+        if preds.evaluate(self.node_pred[0], row) is not True:
+            return -1
+        node = 0
+        while True:
+            if trace is not None:
+                trace.visit(self, node)
+            count = self.node_child_count[node]
+            if count == 0:
+                return node
+            first = self.node_first_child[node]
+            selected = -1
+            unknown = False
+            evaluated = 0
+            for child in range(first, first+count):
+                evaluated += 1
+                result = preds.evaluate(self.node_pred[child], row)
+                if result is True:
+                    selected = child
+                    break
+                if result is None:
+                    unknown = True
+                    if self.missing_value_strategy != 'none':
+                        break
+            if trace is not None:
+                trace.evaluated(self, evaluated)
+            if selected < 0 and unknown:
+                strategy = self.missing_value_strategy
+                if trace is not None and strategy != 'none':
+                    trace.fallback(self, node)
+                if strategy == 'lastPrediction':
+                    return node
+                if strategy == 'nullPrediction':
+                    return -1
+                if strategy == 'defaultChild':
+                    if self.node_default_child[node] < 0:
+                        return node
+                    selected = self.node_default_child[node]
+                elif strategy in ('weightedConfidence', 'aggregateNodes'):
+                    return self._aggregate(node, row, 1.0)
+            if selected < 0:
+                return node if self.no_true_child_strategy == 'returnLastPrediction' else -1
+            node = selected
+
+    def _aggregate(self, node, row, weight):
+        count = self.node_child_count[node]
+        if count == 0:
+            return [(node, weight)]
+        first = self.node_first_child[node]
+        children = [c for c in range(first, first+count) if self.preds.evaluate(self.node_pred[c], row) is not False]
+        total = sum(self.node_record_count[c] for c in children)
+        if not children or total <= 0:
+            return [(node, weight)]
+        result = []
+        for c in children:
+            result.extend(self._aggregate(c, row, weight * self.node_record_count[c] / total))
+        return result
+
+    def _evaluate(self, row, trace=None):
+        node = self._descend(row, trace)
+        if isinstance(node, list):
+            if self.function_name == 'classification':
+                probabilities = {}
+                for leaf, weight in node:
+                    for label, p in self._distribution(leaf).items():
+                        probabilities[label] = probabilities.get(label, 0.0) + weight * p
+                label = max(probabilities, key=probabilities.get) if probabilities else -1
+                return (label, probabilities, -1)
+            return (sum(weight * self.node_score[leaf] for leaf, weight in node), None, -1)
+        if node < 0:
+            return None
+        if self.function_name == 'classification':
+            return (self.node_label[node], self._distribution(node), self.node_id[node])
+        return (self.node_score[node], None, self.node_id[node])
+
+
+class _RegressionModel(_SubModel):
+    """Regression tables with their numeric and categorical predictor terms stored as parallel arrays."""
+    def __init__(self, elem, ctx):
+        super(_RegressionModel, self).__init__(elem, ctx)
+        ftype = ctx._ftype
+        self.normalization = elem.get('normalizationMethod', 'none')
+        supported = ('none', 'softmax', 'simplemax', 'logit', 'exp') if self.function_name == 'classification' else ('none', 'softmax', 'logit', 'exp')
+        if self.normalization not in supported:
+            raise ValueError("Unsupported normalizationMethod: "+self.normalization)
+        self.table_intercept = array(ftype)
+        self.table_target = array('i')
+        self.table_start = array('i')
+        self.table_length = array('i')
+        self.term_field = array('i')
+        self.term_code = array('i')
+        # compared exactly like the operands of equal predicates
+        self.term_value = array('d')
+        self.term_exponent = array(ftype)
+        self.term_coefficient = array(ftype)
+        for table in _children(elem, 'RegressionTable'):
+            self.table_intercept.append(float(table.get('intercept', 0)))
+            target = table.get('targetCategory')
+            if target is None and self.function_name == 'classification':
+                raise ValueError("RegressionTable of a classification model without targetCategory")
+            self.table_target.append(ctx._intern(target) if target is not None else -1)
+            self.table_start.append(len(self.term_field))
+            for term in table:
+                tag = _tag(term)
+                if tag == 'NumericPredictor':
+                    self.term_field.append(ctx._field(term.get('name'), 0))
+                    self.term_code.append(_TERM_NUMERIC)
+                    self.term_value.append(0.0)
+                    self.term_exponent.append(float(term.get('exponent', 1)))
+                elif tag == 'CategoricalPredictor':
+                    field = ctx._field(term.get('name'), term.get('value'))
+                    self.term_field.append(field)
+                    if ctx._categorical[field]:
+                        self.term_code.append(ctx._category_code(field, term.get('value')))
+                        self.term_value.append(0.0)
+                    else:
+                        # categorical predictor of a continuous field, compared numerically
+                        self.term_code.append(_TERM_EQUAL)
+                        self.term_value.append(float(term.get('value')))
+                    self.term_exponent.append(1.0)
+                elif tag == 'PredictorTerm':
+                    raise ValueError("Unsupported regression term: PredictorTerm")
+                else:
+                    continue
+                self.term_coefficient.append(float(term.get('coefficient')))
+            self.table_length.append(len(self.term_field) - self.table_start[-1])
+        if len(self.table_intercept) == 0:
+            raise ValueError("RegressionModel without RegressionTable")
+
+    def _table_value(self, t, row):
+        value = self.table_intercept[t]
+        start = self.table_start[t]
+        for i in range(start, start+self.table_length[t]):
+            v = row[self.term_field[i]]
+            code = self.term_code[i]
+            if code >= 0:
+                if v == code:
+                    value += self.term_coefficient[i]
+            elif code == _TERM_EQUAL:
+                if v is not None and v == self.term_value[i]:
+                    value += self.term_coefficient[i]
+            elif v is None:
+                return None
+            else:
+                value += self.term_coefficient[i] * (v ** self.term_exponent[i])
+        return value
+
+    def _evaluate(self, row, trace=None):
+        values = [self._table_value(t, row) for t in range(len(self.table_intercept))]
+        if None in values:
+            return None
+        method = self.normalization
+        if self.function_name != 'classification':
+            y = values[0]
+            if method in ('softmax', 'logit'):
+                y = 1.0 / (1.0 + math.exp(-y))
+            elif method == 'exp':
+                y = math.exp(y)
+            return (y, None, -1)
+        if method == 'softmax':
+            top = max(values)
+            values = [math.exp(y - top) for y in values]
+            total = sum(values)
+            probabilities = [y / total for y in values]
+        elif method == 'simplemax':
+            total = sum(values)
+            probabilities = [y / total for y in values]
+        else:
+            if method == 'logit':
+                probabilities = [1.0 / (1.0 + math.exp(-y)) for y in values[:-1]]
+            elif method == 'exp':
+                probabilities = [math.exp(y) for y in values[:-1]]
+            else:
+                probabilities = values[:-1]
+            probabilities.append(1.0 - sum(probabilities))
+        result = dict(zip(self.table_target, probabilities))
+        return (max(result, key=result.get), result, -1)
+
+
+class _Segment(object):
+    def __init__(self, elem, position, ctx):
+        self.id = elem.get('id', str(position))
+        self.weight = float(elem.get('weight', 1))
+        self.digest = _digest(elem)
+        model = _child(elem, *_MODEL_TAGS)
+        if model is None:
+            raise ValueError("Segment "+self.id+" does not contain a supported model")
+        self.model = _compile_model(model, ctx)
+        pred = _child(elem, *_PREDICATE_TAGS)
+        self.pred = self.model.preds.compile(pred, ctx) if pred is not None else self.model.preds._append(_TRUE)
+        # records and seconds counted by CompactModel.score_batch
+        self.timing = [0, 0.0]
+
+    def applies(self, row):
+        return self.model.preds.evaluate(self.pred, row) is True
+
+
+class _MiningModel(_SubModel):
+    """Ensemble of segments, each segment owns the compact arrays of its model."""
+    def __init__(self, elem, ctx):
+        super(_MiningModel, self).__init__(elem, ctx)
+        segmentation = _child(elem, 'Segmentation')
+        if segmentation is None:
+            raise ValueError("MiningModel without Segmentation")
+        self.method = segmentation.get('multipleModelMethod')
+        if self.method not in ('majorityVote', 'weightedMajorityVote', 'average', 'weightedAverage', 'sum', 'median', 'max', 'selectFirst'):
+            raise ValueError("Unsupported multipleModelMethod: "+str(self.method))
+        self.segments = [_Segment(s, i+1, ctx) for i, s in enumerate(_children(segmentation, 'Segment'))]
+
+    def trees(self):
+        return [tree for segment in self.segments for tree in segment.model.trees()]
+
+    def _evaluate(self, row, trace=None, segments=None):
+        if segments is None:
+            segments = self.segments
+        if self.method == 'selectFirst':
+            for segment in segments:
+                if segment.applies(row):
+                    return segment.model._evaluate(row, trace)
+            return None
+        results = []
+        for segment in segments:
+            if segment.applies(row):
+                result = segment.model._evaluate(row, trace)
+                if result is not None:
+                    results.append((segment.weight, result))
+        return self._combine(results)
+
+    def _evaluate_timed(self, row, segments, weights, early_termination, timings):
+        """Evaluates one row like :py:meth:`_evaluate` and adds the time spent in each segment to ``timings``.
+
+        For majority votes the evaluation stops once the remaining ``weights`` cannot change the winning category, the result then has no probabilities.
+        """
+        clock = time.perf_counter
+        if self.method == 'selectFirst':
+            for s, segment in enumerate(segments):
+                start = clock()
+                applies = segment.applies(row)
+                result = segment.model._evaluate(row) if applies else None
+                timing = timings[s]
+                timing[0] += 1
+                timing[1] += clock() - start
+                if applies:
+                    return result
+            return None
+        vote = self.function_name == 'classification' and self.method in ('majorityVote', 'weightedMajorityVote')
+        remaining = sum(weights)
+        votes = {}
+        results = []
+        last = len(segments) - 1
+        for s, segment in enumerate(segments):
+            start = clock()
+            result = segment.model._evaluate(row) if segment.applies(row) else None
+            timing = timings[s]
+            timing[0] += 1
+            timing[1] += clock() - start
+            if not vote:
+                if result is not None:
+                    results.append((segment.weight, result))
+                continue
+            remaining -= weights[s]
+            if result is not None:
+                votes[result[0]] = votes.get(result[0], 0.0) + weights[s]
+            if early_termination and s < last and _decided(votes, remaining):
+                # the remaining segments cannot overtake the leading category
+                return (max(votes, key=votes.get), None, -1)
+        return _vote(votes) if vote else self._combine(results)
+
+    def _combine(self, results):
+        if not results:
+            return None
+        method = self.method
+        if self.function_name == 'classification':
+            if method in ('majorityVote', 'weightedMajorityVote'):
+                votes = {}
+                for weight, result in results:
+                    votes[result[0]] = votes.get(result[0], 0.0) + (weight if method == 'weightedMajorityVote' else 1.0)
+                return _vote(votes)
+            probabilities = {}
+            total = 0.0
+            for weight, result in results:
+                w = weight if method == 'weightedAverage' else 1.0
+                total += w
+                for label, p in (result[1] or {result[0]: 1.0}).items():
+                    if method == 'max':
+                        probabilities[label] = max(probabilities.get(label, 0.0), p)
+                    else:
+                        probabilities[label] = probabilities.get(label, 0.0) + w * p
+            if method in ('average', 'weightedAverage'):
+                probabilities = dict((label, p / total) for label, p in probabilities.items())
+            return (max(probabilities, key=probabilities.get), probabilities, -1)
+        values = [result[0] for weight, result in results]
+        if method in ('average', 'majorityVote'):
+            return (sum(values) / len(values), None, -1)
+        if method in ('weightedAverage', 'weightedMajorityVote'):
+            total = sum(weight for weight, result in results)
+            return (sum(weight * result[0] for weight, result in results) / total, None, -1)
+        if method == 'sum':
+            return (sum(values), None, -1)
+        if method == 'max':
+            return (max(values), None, -1)
+        values = sorted(values)
+        middle = len(values) // 2
+        return (values[middle] if len(values) % 2 else (values[middle-1] + values[middle]) / 2.0, None, -1)
+
+
+def _vote(votes):
+    if not votes:
+        return None
+    total = sum(votes.values())
+    probabilities = dict((label, v / total) for label, v in votes.items())
+    return (max(probabilities, key=probabilities.get), probabilities, -1)
+
+def _decided(votes, remaining):
+    if not votes:
+        return remaining <= 0
+    ranked = sorted(votes.values(), reverse=True)
+    runner_up = ranked[1] if len(ranked) > 1 else 0.0
+    return ranked[0] - runner_up > remaining
+
+def _score_chunk(mining, segments, rows, early_termination):
+    weighted = mining.method == 'weightedMajorityVote'
+    weights = [segment.weight if weighted else 1.0 for segment in segments]
+    timings = [[0, 0.0] for segment in segments]
+    results = [mining._evaluate_timed(row, segments, weights, early_termination, timings) for row in rows]
+    return results, timings
+
+# model of a worker process of a _ModelProcessPool, set once by the pool initializer
+_worker_model = None
+
+def _init_worker(version, mining, segments):
+    global _worker_model
+    _worker_model = (version, mining, segments)
+
+def _score_pooled_chunk(version, rows, early_termination):
+    if _worker_model is None or _worker_model[0] != version:
+        raise ValueError("The process pool was created for another version of the model, create a new one with CompactModel.process_pool()")
+    return _score_chunk(_worker_model[1], _worker_model[2], rows, early_termination)
+
+
+class _ModelProcessPool(ProcessPoolExecutor):
+    """Process pool whose workers receive the compiled ensemble once when they start."""
+    def __init__(self, workers, mining, segments):
+        version = uuid.uuid4().hex
+        super(_ModelProcessPool, self).__init__(workers, initializer=_init_worker, initargs=(version, mining, segments))
+        self.version = version
+        self.segments = segments
+
+
+def _compile_model(elem, ctx):
+    tag = _tag(elem)
+    if tag == 'TreeModel':
+        return _TreeModel(elem, ctx)
+    if tag == 'RegressionModel':
+        return _RegressionModel(elem, ctx)
+    if tag == 'MiningModel':
+        return _MiningModel(elem, ctx)
+    raise ValueError("Unsupported model type: "+tag)
+
+
+class CompactModel(object):
+    """PMML model compiled into contiguous typed arrays.
+
+    Tree nodes, predicates, score distributions and regression tables are held in :py:class:`array.array` objects instead of one Python object per node.
+    Strings like category values and node ids are interned once per model and referenced by integer codes.
+    Use :py:func:`load_model` to create an instance.
+    """
+    def __init__(self, root, float32=False):
+        self._ftype = 'f' if float32 else 'd'
+        self._fields = []
+        self._field_index = {}
+        self._categorical = []
+        self._kinds = []
+        self._strings = []
+        self._codes = {}
+        dictionary = _child(root, 'DataDictionary')
+        if dictionary is not None:
+            for field in _children(dictionary, 'DataField'):
+                data_type = field.get('dataType')
+                # the optype decides how values are compared, the dataType is only a fallback
+                if field.get('optype') is not None:
+                    categorical = field.get('optype') in _CATEGORICAL_OPTYPES
+                else:
+                    categorical = data_type in _CATEGORICAL_TYPES
+                kind = 'numeric' if data_type in _NUMERIC_TYPES else ('boolean' if data_type == 'boolean' else 'string')
+                self._add_field(field.get('name'), categorical, kind)
+        model = _child(root, *_MODEL_TAGS)
+        if model is None:
+            raise ValueError("PMML document does not contain a supported model (TreeModel, RegressionModel or MiningModel)")
+        self.model_name = model.get('modelName')
+        self._model = _compile_model(model, self)
+        self._header_digest = _header_digest(root, model) if isinstance(self._model, _MiningModel) else None
+
+    @property
+    def function_name(self):
+        """str: The ``functionName`` of the model, either ``classification`` or ``regression``."""
+        return self._model.function_name
+
+    @property
+    def float32(self):
+        """bool: ``True`` if thresholds, scores and distributions are stored with single precision."""
+        return self._ftype == 'f'
+
+    @property
+    def fields(self):
+        """list: Names of the input fields used by the model."""
+        return list(self._fields)
+
+    @property
+    def memory_footprint(self):
+        """int: Approximate number of bytes used by the compiled model data, the typed arrays and the interned strings."""
+        return _array_bytes(self._model) + sum(sys.getsizeof(s) for s in self._strings) + sys.getsizeof(self._codes)
+
+    @property
+    def segment_timings(self):
+        """list: For ``MiningModel`` ensembles the time spent in each top-level segment by :py:meth:`score_batch`.
+
+        Each entry is a dict with the segment ``id``, the number of ``records`` the segment evaluated and the elapsed ``seconds``.
+        """
+        if not isinstance(self._model, _MiningModel):
+            return []
+        return [{'id': segment.id, 'records': segment.timing[0], 'seconds': segment.timing[1]} for segment in self._model.segments]
+
+    def reset_segment_timings(self):
+        """Resets the counters reported by :py:attr:`segment_timings`."""
+        if isinstance(self._model, _MiningModel):
+            for segment in self._model.segments:
+                segment.timing = [0, 0.0]
+
+    def _add_field(self, name, categorical, kind):
+        self._field_index[name] = len(self._fields)
+        self._fields.append(name)
+        self._categorical.append(categorical)
+        self._kinds.append(kind)
+        return self._field_index[name]
+
+    def _field(self, name, sample):
+        if name in self._field_index:
+            return self._field_index[name]
+        # field not declared in the data dictionary, derive the type from the predicate value
+        try:
+            float(sample)
+            categorical = False
+        except (TypeError, ValueError):
+            categorical = sample is not None
+        return self._add_field(name, categorical, 'string' if categorical else 'numeric')
+
+    def _category(self, field, value):
+        """Returns the canonical string of a category value, so that ``2``, ``2.0`` and ``"2"`` of an integer field or ``True`` and ``"true"`` of a boolean field match."""
+        kind = self._kinds[field]
+        if kind == 'numeric':
+            try:
+                return repr(float(value))
+            except (TypeError, ValueError):
+                return str(value)
+        if kind == 'boolean':
+            text = str(value).strip().lower()
+            return {'1': 'true', '0': 'false', '1.0': 'true', '0.0': 'false'}.get(text, text)
+        return str(value)
+
+    def _category_code(self, field, value):
+        return self._intern(self._category(field, value))
+
+    def _intern(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self._strings)
+            self._codes[value] = code
+            self._strings.append(value)
+        return code
+
+    def _encode(self, record):
+        row = []
+        codes = self._codes
+        for field, (name, categorical) in enumerate(zip(self._fields, self._categorical)):
+            v = record.get(name)
+            if v is None or v == '':
+                row.append(None)
+            elif categorical:
+                row.append(codes.get(self._category(field, v), _UNKNOWN_CODE))
+            else:
+                v = float(v)
+                row.append(None if math.isnan(v) else v)
+        return row
+
+    def _decode(self, result):
+        if result is None:
+            return {'predictedValue': None}
+        value, probabilities, entity = result
+        strings = self._strings
+        if self.function_name == 'classification':
+            decoded = {'predictedValue': strings[value] if value >= 0 else None}
+            if probabilities is not None:
+                decoded['probabilities'] = dict((strings[label], p) for label, p in probabilities.items())
+        else:
+            decoded = {'predictedValue': value}
+        if entity >= 0:
+            decoded['entityId'] = strings[entity]
+        return decoded
+
+    def score(self, record):
+        """Scores a single record.
+
+        Args:
+            record(dict): Maps model field names to values. Missing fields, ``None`` and empty strings are treated as missing values.
+
+        Returns:
+            dict: The ``predictedValue``, for classification models the ``probabilities`` of the target categories and, when the model is a tree, the ``entityId`` of the scoring node.
+        """
+        if isinstance(self._model, _MiningModel):
+            # the segments are read before the record is encoded, see apply_delta
+            segments = self._model.segments
+            return self._decode(self._model._evaluate(self._encode(record), segments=segments))
+        return self._decode(self._model._evaluate(self._encode(record)))
+
+
+    def apply_delta(self, delta):
+        """Patches the segments of a ``MiningModel`` ensemble in place.
+
+        Segments that are referenced by their content hash keep their compiled form, only the segments contained in the delta are compiled.
+        The segments are compiled into copies of the field and string tables, so a delta that fails to compile leaves the model unchanged.
+        The tables only grow, they are published before the new segment list replaces the current one in a single assignment.
+        :py:meth:`score` and :py:meth:`score_batch` read the segment list once before encoding the records, so records scored concurrently use either the old or the new segments.
+
+        Args:
+            delta(dict): Delta created by :py:func:`model_delta` from the document this model was loaded from.
+
+        Returns:
+            int: Number of compiled segments.
+
+        Raises:
+            ValueError: The delta does not match the loaded model, the complete document has to be loaded instead.
+        """
+        if not isinstance(self._model, _MiningModel) or delta.get('header') != self._header_digest:
+            raise ValueError("Model delta does not match the loaded model")
+        current = dict((segment.digest, segment) for segment in self._model.segments)
+        staging = copy.copy(self)
+        staging._fields = list(self._fields)
+        staging._field_index = dict(self._field_index)
+        staging._categorical = list(self._categorical)
+        staging._kinds = list(self._kinds)
+        staging._strings = list(self._strings)
+        staging._codes = dict(self._codes)
+        segments = []
+        for position, entry in enumerate(delta['segments']):
+            if 'xml' in entry:
+                segments.append(_Segment(ET.fromstring(entry['xml']), position+1, staging))
+            elif entry['digest'] in current:
+                segments.append(current[entry['digest']])
+            else:
+                raise ValueError("Model delta references unknown segment "+str(entry.get('id')))
+        # strings before codes and field attributes before the field names, a concurrent record never sees a code or field without its entry
+        self._strings = staging._strings
+        self._codes = staging._codes
+        self._kinds = staging._kinds
+        self._categorical = staging._categorical
+        self._field_index = staging._field_index
+        self._fields = staging._fields
+        self._model.segments = segments
+        return sum(1 for entry in delta['segments'] if 'xml' in entry)
+
+    def process_pool(self, workers):
+        """Creates a process pool for :py:meth:`score_batch`.
+
+        The compiled model is sent to each worker process once when it starts, the scoring tasks only carry the records.
+        The pool is bound to the current segments, create a new pool after :py:meth:`apply_delta`.
+
+        Args:
+            workers(int): Number of worker processes.
+
+        Returns:
+            concurrent.futures.ProcessPoolExecutor: The pool, shut it down when it is no longer used.
+        """
+        if not isinstance(self._model, _MiningModel):
+            raise ValueError("Process pools are only supported for MiningModel ensembles")
+        return _ModelProcessPool(workers, self._model, self._model.segments)
+
+    def score_batch(self, records, executor=None, workers=None, early_termination=True):
+        """Scores a batch of records.
+
+        For ``MiningModel`` ensembles the batch is split into ``workers`` chunks, each chunk is scored by a task evaluating all segments of the ensemble one after another.
+        The work is parallelised over records, not segments, so a batch with few records does not get faster with more workers.
+        With ``selectFirst`` only the segments up to the first matching one are evaluated.
+        With ``majorityVote`` and ``weightedMajorityVote`` the evaluation of a record stops as soon as the remaining segments cannot change the winning category.
+        The result of such a record contains the ``predictedValue`` but no ``probabilities``, because not all votes were counted.
+        The time spent in each segment is added to :py:attr:`segment_timings`.
+
+        The evaluator is pure Python, so thread pools do not speed up the evaluation. Use a pool created by :py:meth:`process_pool` to use several CPUs.
+
+        Args:
+            records(list): List of dicts mapping model field names to values.
+            executor(concurrent.futures.Executor): Executor running the chunks, records are scored in the calling thread if not set. Other executors than those of :py:meth:`process_pool` receive the model with every chunk.
+            workers(int): Number of chunks, defaults to the number of workers of the ``executor`` or 1.
+            early_termination(bool): Stop evaluating segments once the vote of a record is decided.
+
+        Returns:
+            list: The scoring results in the format of :py:meth:`score`, in the order of ``records``.
+        """
+        if not isinstance(self._model, _MiningModel):
+            return [self._decode(self._model._evaluate(self._encode(record))) for record in records]
+        mining = self._model
+        # one snapshot for the batch, read before the records are encoded, see apply_delta
+        segments = mining.segments
+        rows = [self._encode(record) for record in records]
+        if workers is None:
+            workers = getattr(executor, '_max_workers', 1) if executor is not None else 1
+        size = max(1, -(-len(rows) // max(1, workers)))
+        chunks = [rows[i:i+size] for i in range(0, len(rows), size)]
+        if executor is None:
+            outputs = [_score_chunk(mining, segments, chunk, early_termination) for chunk in chunks]
+        elif isinstance(executor, _ModelProcessPool):
+            if executor.segments is not segments:
+                raise ValueError("The process pool was created for another version of the model, create a new one with process_pool()")
+            futures = [executor.submit(_score_pooled_chunk, executor.version, chunk, early_termination) for chunk in chunks]
+            outputs = [future.result() for future in futures]
+        else:
+            futures = [executor.submit(_score_chunk, mining, segments, chunk, early_termination) for chunk in chunks]
+            outputs = [future.result() for future in futures]
+        results = []
+        for chunk_results, chunk_timings in outputs:
+            results.extend(chunk_results)
+            for segment, (records, seconds) in zip(segments, chunk_timings):
+                segment.timing[0] += records
+                segment.timing[1] += seconds
+        return [self._decode(result) for result in results]
+
+
+def load_model(model, float32=False):
+    """Compiles a PMML model into a :py:class:`CompactModel`.
+
+    Supported are ``TreeModel``, ``RegressionModel`` and ``MiningModel`` ensembles of these.
+    The compact representation uses a fraction of the memory of an object-per-node tree, which allows to keep several model versions in memory.
+
+    Args:
+        model(str|bytes): Path to a PMML file or the PMML document itself.
+        float32(bool): Store thresholds, scores and score distributions with single precision to halve their memory. Values close to a split threshold may be compared against the rounded threshold. Operands of ``equal`` and ``isIn`` comparisons keep double precision.
+
+    Returns:
+        CompactModel: The compiled model. Its ``memory_footprint`` property reports the approximate size in bytes.
+    """
+    return CompactModel(_parse(model), float32)
+
+
+def model_delta(old_model, new_model):
+    """Creates the delta between two versions of a ``MiningModel`` ensemble.
+
+    Segments are compared by their content hash. The delta contains the XML of new and changed segments only, unchanged segments are referenced by their hash.
+    Apply it with :py:meth:`CompactModel.apply_delta` to a model loaded from ``old_model``.
+
+    Args:
+        old_model(str|bytes): Path to the PMML file or the PMML document of the loaded version.
+        new_model(str|bytes): Path to the PMML file or the PMML document of the new version.
+
+    Returns:
+        dict: JSON serializable delta, ``None`` if the complete document has to be loaded, because the models are no ensembles, anything but the segments changed or no segment is unchanged.
+    """
+    old_root = _parse(old_model)
+    new_root = _parse(new_model)
+    old_elem = _child(old_root, *_MODEL_TAGS)
+    new_elem = _child(new_root, *_MODEL_TAGS)
+    if old_elem is None or new_elem is None or _tag(old_elem) != 'MiningModel' or _tag(new_elem) != 'MiningModel':
+        return None
+    header = _header_digest(new_root, new_elem)
+    if header != _header_digest(old_root, old_elem):
+        return None
+    old_digests = set(_digest(s) for s in _children(_child(old_elem, 'Segmentation'), 'Segment'))
+    segments = []
+    for position, segment in enumerate(_children(_child(new_elem, 'Segmentation'), 'Segment')):
+        digest = _digest(segment)
+        entry = {'id': segment.get('id', str(position+1)), 'digest': digest}
+        if digest not in old_digests:
+            tail = segment.tail
+            segment.tail = None
+            entry['xml'] = ET.tostring(segment, encoding='unicode')
+            segment.tail = tail
+        segments.append(entry)
+    if all('xml' in entry for entry in segments):
+        return None
+    return {'header': header, 'segments': segments}
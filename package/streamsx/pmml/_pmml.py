@@ -9,6 +9,7 @@ from streamsx.topology.schema import CommonSchema, StreamSchema
 from streamsx.spl.types import rstring
 import datetime
 import json
+import streamsx.pmml._local as _local
 
 def _add_toolkit_dependency(topo):
     # IMPORTANT: Dependency of this python wrapper to a specific toolkit version
@@ -37,23 +38,28 @@ def model_feed(topology, connection_configuration, model_name=None, model_uid=No
     Models can be created and trained in Watson Studio or by using notebooks.
 
     Args:
-        topology(Topology): Topology to contain the returned stream.
-        connection_configuration(dict,str): The credentials of the IBM cloud Machine Learning service in *JSON* or name of the application configuration.
+        topology(Topology): Topology to contain the returned stream. With a :py:class:`LocalTopology` the feed runs in-process.
+        connection_configuration(dict,str): The credentials of the IBM cloud Machine Learning service in *JSON* or name of the application configuration. With a :py:class:`LocalTopology` the path of a directory containing the model file ``<model_name>.xml`` or ``<model_uid>.xml``.
         model_name(str): A model in the WML repository can be referenced by its name or UID. When you use the name, keep in mind that in the concept of the WML repository the name is ambiguous. Different models may have the same name. The only unique identifier is the model UID. Using the name may be more comfortable as the UID is a long digit string. When you are using the name, make sure that the name is unique in the WML repository. If a name is not unique, the operator will use the first model that matches the name. Use either the ``model_name`` parameter or the ``model_uid`` parameter, if both are given model_name is ignored. 
         model_uid(str): In the WML repository a models UID is a unique identifier. If the model is updated with a new version the UID is the still the same. Use either ``model_name`` or ``model_uid`` parameter, if both are given ``model_name`` is ignored. 
         polling_period(int|datetime.timedelta): The ``polling_period`` controls the interval between the calls to the WML repository. Value can be specified in seconds if 'int' type is used or in 'datetime.timedelta' format.
         name(str): Source name in the Streams context, defaults to a generated name.
 
     Returns:
-        Stream: Object names stream with schema ``com.ibm.streams.pmml::ModelData``.
+        Stream: Object names stream with schema ``com.ibm.streams.pmml::ModelData``. With a :py:class:`LocalTopology` the tuples are dicts with the PMML document as ``model`` and the ``metadata``. If only segments of a ``MiningModel`` changed, a :py:func:`model_delta` is sent as ``delta`` instead of the document, the scorer reads the document from the ``path`` in the metadata if the delta does not apply to its model.
     """
-    # python wrapper pmml toolkit dependency
-    _add_toolkit_dependency(topology)
-
     # check if model_uid or model_name is set
     if (model_uid is None and model_name is None):
         raise ValueError("Use either model_name or model_uid parameter.")
 
+    if isinstance(topology, _local.LocalTopology):
+        if polling_period is not None:
+            polling_period = _check_time_param(polling_period, 'polling_period')
+        return _local.model_feed(topology, connection_configuration, model_name=model_name, model_uid=model_uid, polling_period=polling_period)
+
+    # python wrapper pmml toolkit dependency
+    _add_toolkit_dependency(topology)
+
     if isinstance(connection_configuration, dict):
         configuration = json.dumps(connection_configuration) # JSON string
     else:
@@ -77,7 +83,7 @@ def score(stream, schema, model_input_attribute_mapping, model_output_attribute_
     The model data can be loaded from a file on startup of the operator. Additionally, model data can be sent to the second input port in PMML format. This allows to update the model during runtime. 
 
     Args:
-        stream(Stream): Stream of tuples containing the records to be scored.
+        stream(Stream): Stream of tuples containing the records to be scored. For a stream of a :py:class:`LocalTopology` the records are scored in-process with :py:func:`load_model`.
         schema(Schema): Output streams schema
         model_input_attribute_mapping(str): Maps input stream attributes to predictors in the format ``predictorName1=streamsAttribute1,predictorName2=streamsAttribute2,...`` 
         model_output_attribute_mapping(str): Maps output stream attributes to model output fields in the format ``streamsAttribute1=modelOutputField1,streamsAttribute2=modelOutputField2,...``
@@ -93,14 +99,19 @@ def score(stream, schema, model_input_attribute_mapping, model_output_attribute_
     Returns:
         Output Stream with specified schema
     """
-    # python wrapper pmml toolkit dependency
-    _add_toolkit_dependency(stream.topology)
-
     if model_path is None and model_stream is None:
         raise ValueError("Either set model_path or model_stream or both.")
     if model_output_attribute_mapping is None and raw_result_attribute_name is None:
         raise ValueError("Either set model_output_attribute_mapping or raw_result_attribute_name or both.")
 
+    if isinstance(stream, _local.LocalStream):
+        if initial_model_provisioning_timeout is not None:
+            _check_time_param(initial_model_provisioning_timeout, 'initial_model_provisioning_timeout')
+        return _local.score(stream, schema, model_input_attribute_mapping=model_input_attribute_mapping, model_output_attribute_mapping=model_output_attribute_mapping, model_stream=model_stream, model_path=model_path, success_attribute_name=success_attribute_name, error_reason_attribute_name=error_reason_attribute_name, raw_result_attribute_name=raw_result_attribute_name, wml_meta_data_attribute_name=wml_meta_data_attribute_name)
+
+    # python wrapper pmml toolkit dependency
+    _add_toolkit_dependency(stream.topology)
+
     if model_path is not None:
         model_path = _add_model_file(stream.topology, model_path)
 
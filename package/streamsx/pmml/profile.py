@@ -0,0 +1,308 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2019
+
+"""
+Replays a dataset against a PMML model and reports how the model is evaluated.
+
+The report contains the node hit counts and average depth of each tree, the number of evaluated predicates, the time per record and the number of missing value fallbacks.
+Optionally an equivalent PMML document is written, in which sibling nodes are ordered by their observed frequency::
+
+    python -m streamsx.pmml.profile sample/drug/Drug_pmml_model.xml sample/drug/Drug_dataset.csv --mapping Na_to_K=Na/K --output Drug_reordered.xml
+
+Siblings are only reordered if their predicates are provably mutually exclusive, so the reordered model returns the same results with fewer predicate evaluations for the profiled traffic.
+"""
+
+import argparse
+import csv
+import re
+import sys
+import time
+import xml.etree.ElementTree as ET
+from array import array
+
+from streamsx.pmml._model import CompactModel, _tag, _children, _child, _tree_nodes, _parse_array, _PREDICATE_TAGS
+
+_EXPRESSION = re.compile(r'^\s*([^-+*/\s]+)\s*([-+*/])\s*([^-+*/\s]+)\s*$')
+
+
+class Profile(object):
+    """Node hit counts and timings collected by :py:func:`profile`.
+
+    Trees are numbered in document order, node indexes refer to the breadth-first order of the ``Node`` elements of a tree.
+    """
+    def __init__(self, model):
+        self.model = model
+        self.records = 0
+        self.seconds = 0.0
+        self._trees = model._model.trees()
+        self._index = dict((id(tree), i) for i, tree in enumerate(self._trees))
+        self.hits = [array('l', [0] * len(tree.node_pred)) for tree in self._trees]
+        self.fallbacks = [array('l', [0] * len(tree.node_pred)) for tree in self._trees]
+        self.evaluations = array('l', [0] * len(self._trees))
+
+    # trace interface used by the tree evaluation
+    def visit(self, tree, node):
+        self.hits[self._index[id(tree)]][node] += 1
+
+    def evaluated(self, tree, count):
+        self.evaluations[self._index[id(tree)]] += count
+
+    def fallback(self, tree, node):
+        self.fallbacks[self._index[id(tree)]][node] += 1
+
+    def average_depth(self, tree):
+        """Returns the average depth of the scoring node of a tree, the root node has depth zero."""
+        hits = self.hits[tree]
+        return (sum(hits) - hits[0]) / hits[0] if hits[0] else 0.0
+
+    def average_evaluated(self, tree):
+        """Returns the average number of predicates evaluated per record in a tree."""
+        return self.evaluations[tree] / self.records if self.records else 0.0
+
+    def report(self, out=sys.stdout):
+        """Writes a human readable report."""
+        strings = self.model._strings
+        out.write('records: %d\n' % self.records)
+        out.write('time per record: %.3f ms\n' % (1000.0 * self.seconds / self.records if self.records else 0.0))
+        out.write('missing value fallbacks: %d\n' % sum(sum(f) for f in self.fallbacks))
+        for t, tree in enumerate(self._trees):
+            out.write('\ntree %d: average depth %.2f, predicates evaluated per record %.2f\n' % (t, self.average_depth(t), self.average_evaluated(t)))
+            out.write('  %-10s %-10s %10s %10s\n' % ('node', 'parent', 'hits', 'fallbacks'))
+            parents = _parents(tree)
+            for node in range(len(tree.node_pred)):
+                node_id = strings[tree.node_id[node]] if tree.node_id[node] >= 0 else '#'+str(node)
+                parent = parents[node]
+                parent_id = '' if parent < 0 else (strings[tree.node_id[parent]] if tree.node_id[parent] >= 0 else '#'+str(parent))
+                out.write('  %-10s %-10s %10d %10d\n' % (node_id, parent_id, self.hits[t][node], self.fallbacks[t][node]))
+
+
+def _parents(tree):
+    parents = [-1] * len(tree.node_pred)
+    for node in range(len(tree.node_pred)):
+        first = tree.node_first_child[node]
+        for child in range(first, first+tree.node_child_count[node]):
+            parents[child] = node
+    return parents
+
+def _parse_mapping(mapping):
+    """Parses ``predictorName1=column1,predictorName2=column2,...``, a column may be a binary expression of two columns like ``Na/K``."""
+    result = {}
+    if mapping:
+        for entry in mapping.split(','):
+            name, sep, column = entry.partition('=')
+            if not sep:
+                raise ValueError("Invalid mapping entry: "+entry)
+            result[name.strip()] = column.strip()
+    return result
+
+def _mapped_value(record, column):
+    if column in record:
+        return record[column]
+    match = _EXPRESSION.match(column)
+    if match is None:
+        raise ValueError("Unknown column: "+column)
+    left, op, right = match.groups()
+    a = record[left]
+    b = record[right]
+    if a in (None, '') or b in (None, ''):
+        return None
+    a = float(a)
+    b = float(b)
+    if op == '+':
+        return a + b
+    if op == '-':
+        return a - b
+    if op == '*':
+        return a * b
+    return a / b if b != 0 else None
+
+def read_records(path, mapping=None):
+    """Reads the records of a CSV file with a header line.
+
+    Args:
+        path(str): Path of the CSV file.
+        mapping(str): Maps model fields to columns in the format ``predictorName1=column1,predictorName2=column2,...``. A column may be a binary expression of two columns using ``+``, ``-``, ``*`` or ``/``. Model fields that are not mapped are read from the column with the same name.
+
+    Returns:
+        list: The records as dicts.
+    """
+    mapping = _parse_mapping(mapping)
+    records = []
+    with open(path) as f:
+        for record in csv.DictReader(f):
+            for name, column in mapping.items():
+                record[name] = _mapped_value(record, column)
+            records.append(record)
+    return records
+
+def profile(model, records):
+    """Scores the records and collects the evaluation profile.
+
+    The records are scored twice: a traced pass collects the node hit counts and a separate untraced pass measures the time per record, so the timing does not include the tracing overhead.
+
+    Args:
+        model(CompactModel): The model to profile, see :py:func:`streamsx.pmml.load_model`.
+        records(list): Records as dicts mapping model field names to values.
+
+    Returns:
+        tuple: The :py:class:`Profile` and the list of scoring results.
+    """
+    result = Profile(model)
+    scores = []
+    for record in records:
+        scores.append(model._decode(model._model._evaluate(model._encode(record), result)))
+        result.records += 1
+    start = time.perf_counter()
+    for record in records:
+        model._decode(model._model._evaluate(model._encode(record)))
+    result.seconds = time.perf_counter() - start
+    return result, scores
+
+def _same_result(a, b):
+    """Compares scoring results, NaN values are considered equal."""
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_same_result(a[key], b[key]) for key in a)
+    if isinstance(a, float) and isinstance(b, float) and a != a and b != b:
+        return True
+    return a == b
+
+
+def _value_set(pred, category):
+    """Returns the values accepted by a single field predicate as ``('set', values)`` or ``('range', low, low_closed, high, high_closed)``, ``None`` if unsupported.
+
+    ``category`` converts values of a categorical field to their canonical form, it is ``None`` for continuous fields.
+    """
+    tag = _tag(pred)
+    categorical = category is not None
+    convert = category if categorical else float
+    if tag == 'SimplePredicate':
+        op = pred.get('operator')
+        if op == 'equal':
+            return ('set', set([convert(pred.get('value'))]))
+        if categorical:
+            return None
+        value = float(pred.get('value'))
+        if op == 'lessThan':
+            return ('range', float('-inf'), False, value, False)
+        if op == 'lessOrEqual':
+            return ('range', float('-inf'), False, value, True)
+        if op == 'greaterThan':
+            return ('range', value, False, float('inf'), False)
+        if op == 'greaterOrEqual':
+            return ('range', value, True, float('inf'), False)
+        return None
+    if tag == 'SimpleSetPredicate' and pred.get('booleanOperator') == 'isIn':
+        members = _child(pred, 'Array')
+        return ('set', set(convert(v) for v in _parse_array(members.text if members is not None else '')))
+    return None
+
+def _in_range(value, r):
+    low_ok = value > r[1] or (r[2] and value == r[1])
+    high_ok = value < r[3] or (r[4] and value == r[3])
+    return low_ok and high_ok
+
+def _disjoint(a, b):
+    if a[0] == 'set' and b[0] == 'set':
+        return not (a[1] & b[1])
+    if a[0] == 'set':
+        return not any(_in_range(v, b) for v in a[1])
+    if b[0] == 'set':
+        return _disjoint(b, a)
+    if a[3] < b[1] or (a[3] == b[1] and not (a[4] and b[2])):
+        return True
+    return b[3] < a[1] or (b[3] == a[1] and not (b[4] and a[2]))
+
+def _exclusive(nodes, model):
+    """Returns ``True`` if at most one of the node predicates can be true for any record.
+
+    Only predicates on one common field are considered, if that field is missing all predicates are unknown, so the order does not matter for any missing value strategy.
+    """
+    preds = [_child(node, *_PREDICATE_TAGS) for node in nodes]
+    if any(pred is None or _tag(pred) not in ('SimplePredicate', 'SimpleSetPredicate') for pred in preds):
+        return False
+    fields = set(pred.get('field') for pred in preds)
+    if len(fields) != 1:
+        return False
+    field = fields.pop()
+    index = model._field_index[field]
+    category = (lambda value: model._category(index, value)) if model._categorical[index] else None
+    sets = [_value_set(pred, category) for pred in preds]
+    if None in sets:
+        return False
+    for i in range(len(sets)):
+        for j in range(i+1, len(sets)):
+            if not _disjoint(sets[i], sets[j]):
+                return False
+    return True
+
+def reorder(root, result):
+    """Orders sibling nodes of the trees in a PMML document by their hit counts, most frequent first.
+
+    Args:
+        root(Element): Root element of the PMML document the profiled model was loaded from, it is modified in place.
+        result(Profile): The profile collected for the model.
+
+    Returns:
+        int: The number of sibling groups that were reordered.
+    """
+    trees = [elem for elem in root.iter() if _tag(elem) == 'TreeModel']
+    if len(trees) != len(result.hits):
+        raise ValueError("The PMML document does not match the profiled model")
+    changed = 0
+    for t, tree in enumerate(trees):
+        nodes = list(_tree_nodes(_child(tree, 'Node')))
+        index = dict((id(node), i) for i, node in enumerate(nodes))
+        hits = result.hits[t]
+        for node in nodes:
+            children = _children(node, 'Node')
+            if len(children) < 2 or not _exclusive(children, result.model):
+                continue
+            ordered = sorted(children, key=lambda child: -hits[index[id(child)]])
+            if ordered == children:
+                continue
+            positions = [i for i, elem in enumerate(node) if _tag(elem) == 'Node']
+            tails = [child.tail for child in children]
+            for position, tail, child in zip(positions, tails, ordered):
+                child.tail = tail
+                node[position] = child
+            changed += 1
+    return changed
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='python -m streamsx.pmml.profile', description='Profile the evaluation of a PMML model with a CSV dataset.')
+    parser.add_argument('model', help='PMML model file')
+    parser.add_argument('data', help='CSV file with a header line')
+    parser.add_argument('--mapping', help='predictorName1=column1,predictorName2=column2,... a column may be an expression like Na/K')
+    parser.add_argument('--output', help='write the model with sibling nodes ordered by observed frequency to this file')
+    options = parser.parse_args(args)
+
+    tree = ET.parse(options.model)
+    model = CompactModel(tree.getroot())
+    records = read_records(options.data, options.mapping)
+    result, scores = profile(model, records)
+    result.report()
+
+    if options.output is not None:
+        root = tree.getroot()
+        namespace = root.tag[1:].split('}')[0] if root.tag.startswith('{') else None
+        changed = reorder(root, result)
+        # the reordered model is profiled again to verify the results and to report the savings
+        reordered = CompactModel(root)
+        reordered_result, reordered_scores = profile(reordered, records)
+        if len(reordered_scores) != len(scores) or not all(_same_result(a, b) for a, b in zip(scores, reordered_scores)):
+            sys.stderr.write('Reordered model returns different results, no output written\n')
+            return 1
+        if namespace is not None:
+            ET.register_namespace('', namespace)
+        tree.write(options.output, encoding='UTF-8', xml_declaration=True)
+        before = sum(result.evaluations) / len(records) if records else 0.0
+        after = sum(reordered_result.evaluations) / len(records) if records else 0.0
+        sys.stdout.write('\nreordered %d sibling groups, predicates evaluated per record %.2f -> %.2f\n' % (changed, before, after))
+        sys.stdout.write('written '+options.output+'\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
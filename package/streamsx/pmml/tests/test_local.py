@@ -0,0 +1,171 @@
+import streamsx.pmml as pmml
+from streamsx.pmml.tests.test_model import REGRESSION_MODEL
+
+from streamsx.topology.schema import StreamSchema
+import unittest
+import datetime
+import json
+import os
+import shutil
+import tempfile
+
+def drug_model_file():
+    script_dir = os.path.dirname(os.path.realpath(__file__))
+    return os.path.join(script_dir, '..', '..', '..', '..', 'sample', 'drug', 'Drug_pmml_model.xml')
+
+def ensemble_model_file():
+    script_dir = os.path.dirname(os.path.realpath(__file__))
+    return os.path.join(script_dir, 'ensemble.xml')
+
+
+class TestLocal(unittest.TestCase):
+
+    def setUp(self):
+        self.model_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.model_dir)
+
+    def _run(self, topo, stream):
+        results = []
+        stream.for_each(results.append)
+        topo.run()
+        return results
+
+    def test_score(self):
+        topo = pmml.LocalTopology('test_score')
+        s = topo.source([(10.0, 'HIGH', 60), (25.0, 'LOW', 23), ('x', 'LOW', 23)])
+        s = s.map(lambda x : x, schema=StreamSchema('tuple<float64 ratio, rstring bp, int32 age>').as_tuple())
+        out_schema = StreamSchema('tuple<int32 age, boolean success, rstring errorReason, rstring result>')
+        res = pmml.score(s, schema=out_schema, model_input_attribute_mapping='Na_to_K=ratio,BP=bp,Age=age', model_path=drug_model_file(), success_attribute_name='success', error_reason_attribute_name='errorReason', raw_result_attribute_name='result')
+        results = self._run(topo, res)
+        self.assertEqual(3, len(results))
+        self.assertEqual(['age', 'success', 'errorReason', 'result'], list(results[0].keys()))
+        self.assertTrue(results[0]['success'])
+        self.assertEqual('drugB', json.loads(results[0]['result'])[0]['predictedValue'])
+        self.assertEqual('drugY', json.loads(results[1]['result'])[0]['predictedValue'])
+        self.assertFalse(results[2]['success'])
+        self.assertNotEqual('', results[2]['errorReason'])
+
+    def test_score_errors(self):
+        model_path = os.path.join(self.model_dir, 'regression.xml')
+        with open(model_path, 'w') as f:
+            f.write(REGRESSION_MODEL)
+        topo = pmml.LocalTopology('test_score_errors')
+        # a plain tuple without schema and a value that overflows x**2
+        s = topo.source([(1.0, 'a'), {'x': 1e200, 'c': 'a'}, {'x': 2, 'c': 'a'}])
+        res = pmml.score(s, schema='tuple<float64 x, boolean success, rstring errorReason, float64 y>', model_input_attribute_mapping='x=x,c=c', model_path=model_path, model_output_attribute_mapping='y=predictedValue', success_attribute_name='success', error_reason_attribute_name='errorReason')
+        results = self._run(topo, res)
+        self.assertEqual(3, len(results))
+        self.assertEqual([False, False, True], [r['success'] for r in results])
+        self.assertIn('tuple', results[0]['errorReason'])
+        self.assertNotEqual('', results[1]['errorReason'])
+        self.assertAlmostEqual(13.5, results[2]['y'])
+
+    def test_score_with_feed_encoding(self):
+        with open(drug_model_file(), 'rb') as f:
+            content = f.read()
+        # the XML declaration of the document defines the encoding
+        content = content.replace(b'encoding="UTF-8"', b'encoding="ISO-8859-1"').replace(b'<Header', b'<!-- Mod\xe8le --><Header', 1)
+        with open(os.path.join(self.model_dir, 'drug.xml'), 'wb') as f:
+            f.write(content)
+        topo = pmml.LocalTopology('test_score_with_feed_encoding')
+        models = pmml.model_feed(topo, connection_configuration=self.model_dir, model_name='drug')
+        s = topo.source([{'bp': 'HIGH'}])
+        res = pmml.score(s, schema='tuple<rstring y>', model_input_attribute_mapping='BP=bp', model_stream=models, model_output_attribute_mapping='y=predictedValue')
+        self.assertEqual([{'y': 'drugY'}], self._run(topo, res))
+
+    def test_score_output_mapping(self):
+        topo = pmml.LocalTopology('test_score_output_mapping')
+        s = topo.source([{'x': 6, 'c': 'a'}, {'x': 1, 'c': 'a'}])
+        out_schema = 'tuple<int32 x, rstring resultValue, float64 p>'
+        res = pmml.score(s, schema=out_schema, model_input_attribute_mapping='x=x,c=c', model_path=ensemble_model_file(), model_output_attribute_mapping='resultValue=predictedValue,p=probability(yes)')
+        results = self._run(topo, res)
+        self.assertEqual([{'x': 6, 'resultValue': 'yes', 'p': 1.0}, {'x': 1, 'resultValue': 'no', 'p': 1.0/3}], results)
+
+    def test_score_with_feed(self):
+        shutil.copy(drug_model_file(), os.path.join(self.model_dir, 'drug.xml'))
+        topo = pmml.LocalTopology('test_score_with_feed')
+        models = pmml.model_feed(topo, connection_configuration=self.model_dir, model_name='drug', polling_period=datetime.timedelta(minutes=5))
+        s = topo.source(['first tuple', 'second tuple']).as_string()
+        out_schema = StreamSchema('tuple<rstring string, rstring result, map<rstring,rstring> meta>')
+        res = pmml.score(s, schema=out_schema, model_input_attribute_mapping='BP=string', model_stream=models, raw_result_attribute_name='result', wml_meta_data_attribute_name='meta', initial_model_provisioning_timeout=datetime.timedelta(minutes=1))
+        results = self._run(topo, res)
+        self.assertEqual('first tuple', results[0]['string'])
+        self.assertEqual('drug', results[0]['meta']['name'])
+        self.assertEqual('drugY', json.loads(results[0]['result'])[0]['predictedValue'])
+
+    def test_score_without_model(self):
+        topo = pmml.LocalTopology('test_score_without_model')
+        models = pmml.model_feed(topo, connection_configuration=self.model_dir, model_uid='missing')
+        s = topo.source(['first tuple']).as_string()
+        res = pmml.score(s, schema='tuple<rstring string, boolean success, rstring errorReason>', model_input_attribute_mapping='p=string', model_stream=models, success_attribute_name='success', error_reason_attribute_name='errorReason', raw_result_attribute_name='result')
+        results = self._run(topo, res)
+        self.assertEqual([{'string': 'first tuple', 'success': False, 'errorReason': 'No model loaded'}], results)
+
+    def test_model_feed_bad_params(self):
+        topo = pmml.LocalTopology('test_model_feed_bad_params')
+        self.assertRaises(ValueError, pmml.model_feed, topo, connection_configuration=self.model_dir)
+        self.assertRaises(ValueError, pmml.model_feed, topo, connection_configuration='/no/such/dir', model_name='any_model')
+        self.assertRaises(TypeError, pmml.model_feed, topo, connection_configuration=self.model_dir, model_name='any_model', polling_period='1')
+
+    def test_score_with_incremental_feed(self):
+        model_path = os.path.join(self.model_dir, 'ensemble.xml')
+        with open(ensemble_model_file()) as f:
+            old = f.read()
+        with open(model_path, 'w') as f:
+            f.write(old)
+        topo = pmml.LocalTopology('test_score_with_incremental_feed')
+        models = pmml.model_feed(topo, connection_configuration=self.model_dir, model_name='ensemble')
+        updates = []
+        models.for_each(updates.append)
+        def records():
+            yield {'x': 1, 'c': 'a'}
+            # retrain the first segment
+            with open(model_path, 'w') as f:
+                f.write(old.replace('value="5"', 'value="0"'))
+            topo._feeds[0].poll(force=True)
+            yield {'x': 1, 'c': 'a'}
+        s = topo.source(records)
+        res = pmml.score(s, schema='tuple<rstring y, map<rstring,rstring> meta>', model_input_attribute_mapping='x=x,c=c', model_stream=models, model_output_attribute_mapping='y=predictedValue', wml_meta_data_attribute_name='meta')
+        results = self._run(topo, res)
+        self.assertEqual(['full', 'delta'], [u['metadata']['update'] for u in updates])
+        self.assertEqual(1, len([s for s in updates[1]['delta']['segments'] if 'xml' in s]))
+        self.assertNotIn('model', updates[1])
+        self.assertEqual(updates[0]['metadata']['hash'], updates[1]['metadata']['base_hash'])
+        self.assertEqual('no', results[0]['y'])
+        self.assertEqual('yes', results[1]['y'])
+        self.assertEqual('delta', results[1]['meta']['update'])
+
+    def test_score_after_rejected_model(self):
+        model_path = os.path.join(self.model_dir, 'ensemble.xml')
+        with open(ensemble_model_file()) as f:
+            v1 = f.read()
+        # v2 changes the header and contains an unsupported operator, v3 shares the header of v2
+        v2 = v1.replace('modelName="ensemble"', 'modelName="ensemble2"').replace('operator="greaterThan" value="5"', 'operator="unknown" value="5"')
+        v3 = v2.replace('operator="unknown" value="5"', 'operator="greaterThan" value="0"')
+        with open(model_path, 'w') as f:
+            f.write(v1)
+        topo = pmml.LocalTopology('test_score_after_rejected_model')
+        models = pmml.model_feed(topo, connection_configuration=self.model_dir, model_name='ensemble')
+        updates = []
+        models.for_each(updates.append)
+        def records():
+            yield {'x': 1, 'c': 'a'}
+            for version in (v2, v3):
+                with open(model_path, 'w') as f:
+                    f.write(version)
+                topo._feeds[0].poll(force=True)
+                yield {'x': 1, 'c': 'a'}
+        s = topo.source(records)
+        res = pmml.score(s, schema='tuple<rstring y, map<rstring,rstring> meta>', model_input_attribute_mapping='x=x,c=c', model_stream=models, model_output_attribute_mapping='y=predictedValue', wml_meta_data_attribute_name='meta')
+        results = self._run(topo, res)
+        self.assertEqual(['full', 'full', 'delta'], [u['metadata']['update'] for u in updates])
+        # the delta tuple does not ship the document
+        self.assertNotIn('model', updates[2])
+        self.assertEqual(updates[1]['metadata']['hash'], updates[2]['metadata']['base_hash'])
+        self.assertEqual(['no', 'no', 'yes'], [r['y'] for r in results])
+        # v2 was rejected, v3 is loaded completely because the delta is based on v2
+        self.assertEqual(updates[0]['metadata']['hash'], results[1]['meta']['hash'])
+        self.assertEqual(updates[2]['metadata']['hash'], results[2]['meta']['hash'])
+        self.assertEqual('full', results[2]['meta']['update'])
@@ -0,0 +1,233 @@
+import streamsx.pmml as pmml
+
+import unittest
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+REGRESSION_MODEL = """<?xml version="1.0" encoding="UTF-8"?>
+<PMML version="4.3" xmlns="http://www.dmg.org/PMML-4_3">
+  <DataDictionary numberOfFields="3">
+    <DataField dataType="double" name="x" optype="continuous"/>
+    <DataField dataType="string" name="c" optype="categorical"/>
+    <DataField dataType="double" name="y" optype="continuous"/>
+  </DataDictionary>
+  <RegressionModel functionName="regression">
+    <MiningSchema><MiningField name="x"/><MiningField name="c"/><MiningField name="y" usageType="predicted"/></MiningSchema>
+    <RegressionTable intercept="1.5">
+      <NumericPredictor name="x" exponent="2" coefficient="0.5"/>
+      <CategoricalPredictor name="c" value="a" coefficient="10"/>
+    </RegressionTable>
+  </RegressionModel>
+</PMML>
+"""
+
+INTEGER_CATEGORY_MODEL = """<?xml version="1.0" encoding="UTF-8"?>
+<PMML version="4.3" xmlns="http://www.dmg.org/PMML-4_3">
+  <DataDictionary numberOfFields="4">
+    <DataField dataType="integer" name="g" optype="categorical"/>
+    <DataField dataType="integer" name="n"/>
+    <DataField dataType="boolean" name="b" optype="categorical"/>
+    <DataField dataType="double" name="y" optype="continuous"/>
+  </DataDictionary>
+  <RegressionModel functionName="regression">
+    <MiningSchema><MiningField name="g"/><MiningField name="n"/><MiningField name="b"/><MiningField name="y" usageType="predicted"/></MiningSchema>
+    <RegressionTable intercept="1">
+      <CategoricalPredictor name="g" value="2" coefficient="10"/>
+      <CategoricalPredictor name="g" value="0" coefficient="100"/>
+      <CategoricalPredictor name="n" value="3" coefficient="1000"/>
+      <CategoricalPredictor name="b" value="true" coefficient="10000"/>
+    </RegressionTable>
+  </RegressionModel>
+</PMML>
+"""
+
+EQUALITY_MODEL = """<?xml version="1.0" encoding="UTF-8"?>
+<PMML version="4.3" xmlns="http://www.dmg.org/PMML-4_3">
+  <DataDictionary numberOfFields="2">
+    <DataField dataType="double" name="x" optype="continuous"/>
+    <DataField dataType="string" name="y" optype="categorical"/>
+  </DataDictionary>
+  <TreeModel functionName="classification">
+    <MiningSchema><MiningField name="x"/><MiningField name="y" usageType="predicted"/></MiningSchema>
+    <Node id="0">
+      <True/>
+      <Node id="1" score="eq"><SimplePredicate field="x" operator="equal" value="0.1"/></Node>
+      <Node id="2" score="set"><SimpleSetPredicate field="x" booleanOperator="isIn"><Array n="2" type="real">0.3 0.7</Array></SimpleSetPredicate></Node>
+      <Node id="3" score="big"><SimplePredicate field="x" operator="equal" value="16777217"/></Node>
+      <Node id="4" score="other"><True/></Node>
+    </Node>
+  </TreeModel>
+</PMML>
+"""
+
+def model_file(name):
+    script_dir = os.path.dirname(os.path.realpath(__file__))
+    return os.path.join(script_dir, name)
+
+def drug_model_file():
+    script_dir = os.path.dirname(os.path.realpath(__file__))
+    return os.path.join(script_dir, '..', '..', '..', '..', 'sample', 'drug', 'Drug_pmml_model.xml')
+
+
+class TestCompactModel(unittest.TestCase):
+
+    def test_tree(self):
+        model = pmml.load_model(drug_model_file())
+        self.assertEqual('classification', model.function_name)
+        result = model.score({'Na_to_K': 10.0, 'BP': 'HIGH', 'Age': 60, 'Cholesterol': 'HIGH'})
+        self.assertEqual('drugB', result['predictedValue'])
+        self.assertEqual('4', result['entityId'])
+        self.assertAlmostEqual(1.0, result['probabilities']['drugB'])
+        result = model.score({'Na_to_K': '25.3', 'BP': 'LOW', 'Age': '23', 'Cholesterol': 'NORMAL'})
+        self.assertEqual('drugY', result['predictedValue'])
+
+    def test_tree_missing_value(self):
+        model = pmml.load_model(drug_model_file())
+        # weightedConfidence aggregates the distributions of all possible child nodes
+        result = model.score({'Na_to_K': 10.0, 'Age': 30})
+        self.assertEqual('drugX', result['predictedValue'])
+        self.assertNotIn('entityId', result)
+
+    def test_float32(self):
+        model = pmml.load_model(drug_model_file())
+        model32 = pmml.load_model(drug_model_file(), float32=True)
+        self.assertTrue(model32.float32)
+        self.assertLess(model32.memory_footprint, model.memory_footprint)
+        record = {'Na_to_K': 10.0, 'BP': 'LOW', 'Age': 30, 'Cholesterol': 'HIGH'}
+        self.assertEqual(model.score(record)['predictedValue'], model32.score(record)['predictedValue'])
+
+    def test_float32_equality(self):
+        for float32 in (False, True):
+            model = pmml.load_model(EQUALITY_MODEL, float32=float32)
+            self.assertEqual(['eq', 'set', 'set', 'big', 'other'], [model.score({'x': x})['predictedValue'] for x in (0.1, 0.3, 0.7, 16777217, 16777216)])
+
+    def test_regression(self):
+        model = pmml.load_model(REGRESSION_MODEL)
+        self.assertEqual(['x', 'c', 'y'], model.fields)
+        self.assertAlmostEqual(13.5, model.score({'x': 2, 'c': 'a'})['predictedValue'])
+        self.assertAlmostEqual(3.5, model.score({'x': 2, 'c': 'unknown'})['predictedValue'])
+        self.assertIsNone(model.score({'c': 'a'})['predictedValue'])
+
+    def test_unsupported_regression(self):
+        self.assertRaises(ValueError, pmml.load_model, REGRESSION_MODEL.replace('<RegressionModel ', '<RegressionModel normalizationMethod="probit" '))
+        classification = REGRESSION_MODEL.replace('functionName="regression"', 'functionName="classification"')
+        self.assertRaises(ValueError, pmml.load_model, classification)
+        for method in ('probit', 'cloglog', 'loglog', 'cauchit'):
+            self.assertRaises(ValueError, pmml.load_model, classification.replace('<RegressionModel ', '<RegressionModel normalizationMethod="'+method+'" ').replace('<RegressionTable ', '<RegressionTable targetCategory="a" '))
+
+    def test_integer_categories(self):
+        model = pmml.load_model(INTEGER_CATEGORY_MODEL)
+        self.assertEqual([101, 1, 11], [model.score({'g': g})['predictedValue'] for g in (0, 1, 2)])
+        self.assertEqual(11, model.score({'g': '2'})['predictedValue'])
+        self.assertEqual(11, model.score({'g': 2.0})['predictedValue'])
+        # n has no optype, the integer dataType makes it continuous
+        self.assertEqual(1001, model.score({'n': 3})['predictedValue'])
+        self.assertEqual(1, model.score({'n': 4})['predictedValue'])
+        self.assertEqual(10001, model.score({'b': True})['predictedValue'])
+        self.assertEqual(10001, model.score({'b': 'true'})['predictedValue'])
+        self.assertEqual(1, model.score({'b': False})['predictedValue'])
+
+    def test_ensemble(self):
+        model = pmml.load_model(model_file('ensemble.xml'))
+        self.assertEqual('yes', model.score({'x': 6, 'c': 'a'})['predictedValue'])
+        self.assertEqual('no', model.score({'x': 1, 'c': 'a'})['predictedValue'])
+        result = model.score({'x': 3, 'c': 'b'})
+        self.assertEqual('yes', result['predictedValue'])
+        self.assertAlmostEqual(2.0/3, result['probabilities']['yes'])
+
+    def test_unsupported_model(self):
+        self.assertRaises(ValueError, pmml.load_model, '<PMML><NaiveBayesModel/></PMML>')
+
+    def test_ensemble_batch(self):
+        model = pmml.load_model(model_file('ensemble.xml'))
+        records = [{'x': x, 'c': c} for x in range(10) for c in ('a', 'b', 'c', None)]
+        expected = [model.score(r) for r in records]
+        for workers in (1, 2, 3):
+            results = model.score_batch(records, workers=workers)
+            self.assertEqual([r['predictedValue'] for r in expected], [r['predictedValue'] for r in results])
+            for result, full in zip(results, expected):
+                # records whose vote was decided early have no probabilities
+                if 'probabilities' in result:
+                    self.assertEqual(full, result)
+        self.assertTrue(any('probabilities' not in r for r in results))
+        results = model.score_batch(records, early_termination=False)
+        self.assertEqual(expected, results)
+        timings = model.segment_timings
+        self.assertEqual(['1', '2', '3'], [t['id'] for t in timings])
+        # early termination skips the last segment once two segments agree
+        self.assertLess(timings[2]['records'], timings[0]['records'])
+        model.reset_segment_timings()
+        self.assertEqual(0, model.segment_timings[0]['records'])
+
+    def test_process_pool(self):
+        model = pmml.load_model(model_file('ensemble.xml'))
+        records = [{'x': x % 10, 'c': 'abc'[x % 3]} for x in range(100)]
+        with model.process_pool(2) as executor:
+            results = model.score_batch(records, executor=executor, early_termination=False)
+        self.assertEqual([model.score(r) for r in records], results)
+        self.assertEqual(100, model.segment_timings[0]['records'])
+        self.assertRaises(ValueError, pmml.load_model(drug_model_file()).process_pool, 2)
+
+    def test_executor_chunks(self):
+        model = pmml.load_model(model_file('ensemble.xml'))
+        records = [{'x': x % 10, 'c': 'abc'[x % 3]} for x in range(30)]
+        with ThreadPoolExecutor(3) as executor:
+            submit = executor.submit
+            tasks = []
+            executor.submit = lambda *args: tasks.append(args) or submit(*args)
+            results = model.score_batch(records, executor=executor, early_termination=False)
+        # one chunk per worker of the executor
+        self.assertEqual(3, len(tasks))
+        self.assertEqual([model.score(r) for r in records], results)
+
+    def test_select_first_batch(self):
+        with open(model_file('ensemble.xml')) as f:
+            model = pmml.load_model(f.read().replace('majorityVote', 'selectFirst'))
+        records = [{'x': x, 'c': 'a'} for x in range(10)]
+        self.assertEqual([model.score(r) for r in records], model.score_batch(records, workers=2))
+        timings = model.segment_timings
+        self.assertEqual(10, timings[0]['records'])
+        self.assertEqual(0, timings[1]['records'])
+
+    def test_apply_delta(self):
+        with open(model_file('ensemble.xml')) as f:
+            old = f.read()
+        new = old.replace('<SimplePredicate field="x" operator="greaterThan" value="5"/>', '<SimplePredicate field="x" operator="greaterThan" value="0"/>')
+        model = pmml.load_model(old)
+        unchanged = model._model.segments[1:]
+        delta = pmml.model_delta(old, new)
+        self.assertEqual(['1', '2', '3'], [entry['id'] for entry in delta['segments']])
+        self.assertEqual([True, False, False], ['xml' in entry for entry in delta['segments']])
+        self.assertEqual(1, model.apply_delta(delta))
+        self.assertIs(unchanged[0], model._model.segments[1])
+        self.assertIs(unchanged[1], model._model.segments[2])
+        reloaded = pmml.load_model(new)
+        records = [{'x': x, 'c': c} for x in range(10) for c in ('a', 'b', 'c')]
+        self.assertEqual([reloaded.score(r) for r in records], [model.score(r) for r in records])
+        # the delta references a segment of the old version, which was replaced
+        self.assertRaises(ValueError, model.apply_delta, pmml.model_delta(old, old.replace('value="2"', 'value="3"')))
+
+    def test_apply_delta_failure(self):
+        with open(model_file('ensemble.xml')) as f:
+            old = f.read()
+        model = pmml.load_model(old)
+        fields = model.fields
+        strings = len(model._strings)
+        segments = model._model.segments
+        # the first changed segment adds a field and a category, the second one fails to compile
+        new = old.replace('<SimplePredicate field="x" operator="greaterThan" value="5"/>', '<SimplePredicate field="z" operator="equal" value="new"/>')
+        new = new.replace('operator="greaterThan" value="2"', 'operator="unknown" value="2"')
+        delta = pmml.model_delta(old, new)
+        self.assertRaises(ValueError, model.apply_delta, delta)
+        self.assertEqual(fields, model.fields)
+        self.assertEqual(strings, len(model._strings))
+        self.assertIs(segments, model._model.segments)
+        self.assertEqual('no', model.score({'x': 1, 'c': 'a'})['predictedValue'])
+
+    def test_model_delta_full_reload(self):
+        with open(model_file('ensemble.xml')) as f:
+            old = f.read()
+        self.assertIsNone(pmml.model_delta(old, old.replace('majorityVote', 'selectFirst')))
+        self.assertIsNone(pmml.model_delta(drug_model_file(), drug_model_file()))
+        model = pmml.load_model(old)
+        self.assertRaises(ValueError, model.apply_delta, {'header': 'x', 'segments': []})
@@ -0,0 +1,69 @@
+import streamsx.pmml as pmml
+import streamsx.pmml.profile as profile
+
+import unittest
+import os
+import io
+import xml.etree.ElementTree as ET
+
+def sample_file(name):
+    script_dir = os.path.dirname(os.path.realpath(__file__))
+    return os.path.join(script_dir, '..', '..', '..', '..', 'sample', 'drug', name)
+
+
+class TestProfile(unittest.TestCase):
+
+    def setUp(self):
+        self.records = profile.read_records(sample_file('Drug_dataset.csv'), 'Na_to_K=Na/K')
+
+    def test_read_records(self):
+        self.assertEqual(200, len(self.records))
+        self.assertAlmostEqual(0.792535/0.031258, self.records[0]['Na_to_K'])
+        self.assertEqual('HIGH', self.records[0]['BP'])
+        self.assertRaises(ValueError, profile.read_records, sample_file('Drug_dataset.csv'), 'Na_to_K')
+
+    def test_profile(self):
+        model = pmml.load_model(sample_file('Drug_pmml_model.xml'))
+        result, scores = profile.profile(model, self.records)
+        self.assertEqual(200, result.records)
+        self.assertEqual([r['Drug'] for r in self.records], [s['predictedValue'] for s in scores])
+        hits = result.hits[0]
+        self.assertEqual(200, hits[0])
+        self.assertEqual(200, hits[1] + hits[2])
+        self.assertEqual(0, sum(result.fallbacks[0]))
+        self.assertGreater(result.average_depth(0), 1.0)
+        out = io.StringIO()
+        result.report(out)
+        self.assertIn('records: 200', out.getvalue())
+
+    def test_missing_value_fallback(self):
+        model = pmml.load_model(sample_file('Drug_pmml_model.xml'))
+        result, scores = profile.profile(model, [{'Na_to_K': 10.0, 'Age': 30}])
+        self.assertEqual(1, sum(result.fallbacks[0]))
+
+    def test_reorder(self):
+        tree = ET.parse(sample_file('Drug_pmml_model.xml'))
+        model = pmml.CompactModel(tree.getroot())
+        result, scores = profile.profile(model, self.records)
+        # BP=NORMAL is hit more often than BP=LOW
+        self.assertEqual(1, profile.reorder(tree.getroot(), result))
+        reordered = pmml.CompactModel(tree.getroot())
+        reordered_result, reordered_scores = profile.profile(reordered, self.records)
+        self.assertEqual(scores, reordered_scores)
+        self.assertLess(sum(reordered_result.evaluations), sum(result.evaluations))
+
+    def test_overlapping_siblings_not_reordered(self):
+        model = pmml.load_model(sample_file('Drug_pmml_model.xml'))
+        nodes = ET.fromstring('<Node><Node><SimplePredicate field="Age" operator="lessOrEqual" value="50"/></Node>'
+            '<Node><SimplePredicate field="Age" operator="greaterOrEqual" value="50"/></Node></Node>')
+        self.assertFalse(profile._exclusive(list(nodes), model))
+        nodes = ET.fromstring('<Node><Node><SimplePredicate field="Age" operator="lessThan" value="50"/></Node>'
+            '<Node><SimplePredicate field="Age" operator="greaterOrEqual" value="50"/></Node></Node>')
+        self.assertTrue(profile._exclusive(list(nodes), model))
+
+    def test_same_result(self):
+        nan = float('nan')
+        self.assertTrue(profile._same_result({'predictedValue': nan}, {'predictedValue': nan}))
+        self.assertTrue(profile._same_result({'predictedValue': 'a', 'probabilities': {'a': 1.0}}, {'predictedValue': 'a', 'probabilities': {'a': 1.0}}))
+        self.assertFalse(profile._same_result({'predictedValue': nan}, {'predictedValue': 1.0}))
+        self.assertFalse(profile._same_result({'predictedValue': 'a'}, {'predictedValue': 'a', 'entityId': '1'}))